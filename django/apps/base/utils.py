@@ -1,7 +1,19 @@
+import yaml
 from django.utils.text import slugify as django_slugify
 from unidecode import unidecode
 
+# Use the fast libyaml-based loader if PyYAML was built with it.
+try:
+    from yaml import CSafeLoader as YamlLoader
+except ImportError:
+    from yaml import SafeLoader as YamlLoader
+
 
 def slugify(text: str):
     """Slugifies Unicore text."""
     return django_slugify(unidecode(text))
+
+
+def load_yaml(stream):
+    """Safely parses a YAML document from a string, bytes or a file."""
+    return yaml.load(stream, Loader=YamlLoader)
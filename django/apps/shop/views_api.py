@@ -1,7 +1,6 @@
 import json
 
 import requests
-import yaml
 from django.conf import settings
 from django.db import IntegrityError
 from django.db.models import Q
@@ -25,6 +24,7 @@ from rest_framework.viewsets import GenericViewSet, ModelViewSet
 
 from apps.base.email import send_email, EmailParams
 from apps.base.serializers import BaseResponseSerializer
+from apps.base.utils import load_yaml
 
 from .filters import ProductFilter
 from .models import (
@@ -99,7 +99,9 @@ class ProductViewSet(mixins.ListModelMixin,
     """View set to retrieve products."""
 
     serializer_class = ProductSerializer
-    queryset = Product.objects.all()
+    queryset = (Product.objects
+                .select_related('seller')
+                .prefetch_related('parameters'))
     filterset_class = ProductFilter
     pagination_class = PageNumberPagination
 
@@ -253,7 +255,9 @@ class OrderViewSet(mixins.ListModelMixin,
     http_method_names = ['post', 'get', 'patch']
 
     serializer_class = OrderSerializer
-    queryset = Order.objects.all()
+    queryset = (Order.objects
+                .select_related('seller', 'shipping_address')
+                .prefetch_related('line_items__product'))
     permission_classes = (OrderPermission,)
 
     def get_queryset(self):
@@ -410,7 +414,7 @@ class CatalogImportView(APIView):
             if data_format == 'json':
                 data = json.load(file)
             else:
-                data = yaml.full_load(file)
+                data = load_yaml(file)
         # There is a URL with a file to retrieve.
         else:
             url = serializer.validated_data.get('url')
@@ -418,7 +422,7 @@ class CatalogImportView(APIView):
             if data_format == 'json':
                 data = response.json()
             else:
-                data = yaml.full_load(response.content)
+                data = load_yaml(response.content)
 
         if data:
             serializer = ProductImportSerializer(data=data, many=True, context={
@@ -0,0 +1,74 @@
+"""
+Django settings for running tests.
+
+Extends the main project settings with overrides that make the test
+suite faster and independent of external services.
+"""
+# noinspection PyUnresolvedReferences
+from .settings import *
+
+# Middleware
+# https://docs.djangoproject.com/en/5.2/topics/http/middleware/
+
+# Only the middleware the API and the admin rely on. The rest (security
+# headers, CSRF, clickjacking, debug toolbar etc.) is irrelevant for the
+# API tests and just adds overhead to every request.
+MIDDLEWARE = [
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+]
+
+# The debug toolbar is left installed but its middleware isn't used.
+SILENCED_SYSTEM_CHECKS = ['debug_toolbar.W001']
+
+
+# Database
+# https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+
+# Tests always use in-memory SQLite: no sockets, no disk I/O, and no
+# database server required.
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+        'TEST': {
+            'NAME': ':memory:',
+        },
+    }
+}
+
+
+# Password hashing
+# https://docs.djangoproject.com/en/5.2/topics/auth/passwords/
+
+# The default PBKDF2 hasher is deliberately slow. Hashes never outlive
+# the test database, so a fast (and insecure) hasher is fine here.
+PASSWORD_HASHERS = [
+    'django.contrib.auth.hashers.MD5PasswordHasher',
+]
+
+# Logging
+# https://docs.djangoproject.com/en/5.2/topics/logging/
+
+# Tests provoke lots of 4xx responses on purpose, so don't log them as
+# warnings. Server errors and application logs are still reported.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'loggers': {
+        'django.request': {
+            'level': 'ERROR',
+        },
+    },
+}
+
+# Simple JWT
+# https://django-rest-framework-simplejwt.readthedocs.io/en/latest/settings.html
+
+# Pin cheap symmetric signing with a fixed key, so tests never depend on
+# the environment's secret or on asymmetric key handling.
+SIMPLE_JWT = SIMPLE_JWT | {
+    'ALGORITHM': 'HS256',
+    'SIGNING_KEY': 'test-signing-key-' + 'x' * 32,
+}
@@ -3,11 +3,22 @@ from datetime import timedelta
 # noinspection PyPackageRequirements
 import pytest
 from django.conf import settings
-from rest_framework.test import APIClient
+from rest_framework.response import Response
+from rest_framework.test import APIClient, APIRequestFactory
 
 from apps.accounts.models import User, UserToken
-from apps.accounts.serializers import UserSerializer
-from tests.utils import assert_response, generate_password, get_user_url
+from apps.accounts.views_api import AccountViewSet
+from tests.utils import (
+    assert_response, generate_password, get_user_url, set_bearer
+)
+
+# Email of a user that never exists in the database.
+EMAIL = 'nobody@example.com'
+# A password that passes validation.
+VALID_PASSWORD = generate_password()
+
+register_view = AccountViewSet.as_view({'post': 'create'})
+request_factory = APIRequestFactory()
 
 
 def prepare_and_register(api_client: APIClient, user_factory):
@@ -19,91 +30,47 @@ def prepare_and_register(api_client: APIClient, user_factory):
         'last_name': user.last_name,
     }
     return api_client.post(get_user_url(), data | {
-        'password': generate_password(),
+        'password': VALID_PASSWORD,
     }), data
 
+def register(data: dict) -> Response:
+    """Calls the registration view directly (bypassing the middleware)."""
+    return register_view(request_factory.post(get_user_url(), data))
 
-@pytest.mark.django_db
-def test_user_register__password_missing(api_client: APIClient, user_factory):
-    """Test user registration (missing password)."""
-    response = api_client.post(get_user_url(), {
-        'email': user_factory(_save=False).email,
-    })
-    assert_response(response, 400, {
-        'password': ["This field is required."]
-    })
 
-@pytest.mark.django_db
-def test_user_register__email_missing(api_client):
-    """Test user registration (missing email)."""
-    response = api_client.post(get_user_url(), {
-        'password': generate_password(),
-    })
-    assert_response(response, 400, {
+@pytest.mark.parametrize('data,errors', [
+    pytest.param({'email': EMAIL}, {
+        'password': ["This field is required."]
+    }, id='password_missing', marks=pytest.mark.django_db),
+    pytest.param({'password': VALID_PASSWORD}, {
         'email': ["This field is required."]
-    })
-
-@pytest.mark.django_db
-def test_user_register__password_empty(api_client: APIClient, user_factory):
-    """Test user registration (empty password)."""
-    response = api_client.post(get_user_url(), {
-        'email': user_factory(_save=False).email,
-        'password': '',
-    })
-    assert_response(response, 400, {
+    }, id='email_missing'),
+    pytest.param({'email': EMAIL, 'password': ''}, {
         'password': ["This field may not be blank."]
-    })
-
-@pytest.mark.django_db
-def test_user_register__password_simple(api_client: APIClient, user_factory):
-    """Test user registration (one-digit password)."""
-    response = api_client.post(get_user_url(), {
-        'email': user_factory(_save=False).email,
-        'password': '1',
-    })
-    assert_response(response, 400, {
+    }, id='password_empty', marks=pytest.mark.django_db),
+    pytest.param({'email': EMAIL, 'password': '1'}, {
         'password': [
             "This password is too short. It must contain at least 8 characters.",
             "This password is too common.",
             "This password is entirely numeric."
         ]
-    })
-
-@pytest.mark.django_db
-def test_user_register__password_common_numeric(api_client: APIClient, user_factory):
-    """Test user registration (common numeric password)."""
-    response = api_client.post(get_user_url(), {
-        'email': user_factory(_save=False).email,
-        'password': '1234567890',
-    })
-    assert_response(response, 400, {
+    }, id='password_simple', marks=pytest.mark.django_db),
+    pytest.param({'email': EMAIL, 'password': '1234567890'}, {
         'password': [
             "This password is too common.",
             "This password is entirely numeric."
         ]
-    })
-
-@pytest.mark.django_db
-def test_user_register__password_common_alpha(api_client: APIClient, user_factory):
-    """Test user registration (common alpha password)."""
-    response = api_client.post(get_user_url(), {
-        'email': user_factory(_save=False).email,
-        'password': 'qwertyui',
-    })
-    assert_response(response, 400, {
+    }, id='password_common_numeric', marks=pytest.mark.django_db),
+    pytest.param({'email': EMAIL, 'password': 'qwertyui'}, {
         'password': ["This password is too common."]
-    })
-
-@pytest.mark.django_db
-def test_user_register__password_similar_to_email(api_client: APIClient):
-    """Test user registration (password resembles email)."""
-    response = api_client.post(get_user_url(), {
-        'email': 'test@test.com',
-        'password': 'Test1@test.com',
-    })
-    assert_response(response, 400, {
+    }, id='password_common_alpha', marks=pytest.mark.django_db),
+    pytest.param({'email': 'test@test.com', 'password': 'Test1@test.com'}, {
         'password': ["The password is too similar to the email address."]
-    })
+    }, id='password_similar_to_email', marks=pytest.mark.django_db),
+])
+def test_user_register__invalid(data: dict, errors: dict):
+    """Test user registration (invalid data)."""
+    assert_response(register(data), 400, errors)
 
 @pytest.mark.django_db
 def test_user_register__bare_minimum(api_client: APIClient, user_factory):
@@ -111,12 +78,11 @@ def test_user_register__bare_minimum(api_client: APIClient, user_factory):
     data = {
         'email': user_factory(_save=False).email,
     }
-    password = generate_password()
     response = api_client.post(get_user_url(), data | {
-        'password': password,
+        'password': VALID_PASSWORD,
     })
     assert_response(response, 201, data | {
-        'id': User.objects.order_by('-created_at').last().id,
+        'id': User.objects.get(email=data['email']).pk,
         'first_name': '',
         'last_name': ''
     })
@@ -127,7 +93,7 @@ def test_user_register__success(api_client: APIClient, user_factory, mailoutbox)
     # Check user registered.
     response, data = prepare_and_register(api_client, user_factory)
     assert_response(response, 201, data | {
-        'id': User.objects.order_by('-created_at').last().id,
+        'id': User.objects.get(email=data['email']).pk,
     })
 
     # Check that the verification email was sent.
@@ -140,27 +106,25 @@ def test_user_register__exists(api_client: APIClient, user_factory):
     user = user_factory()
     response = api_client.post(get_user_url(), {
         'email': user.email,
-        'password': generate_password(),
+        'password': VALID_PASSWORD,
     })
     assert_response(response, 400, {
         'email': ["user with this email address already exists."]
     })
 
 @pytest.mark.django_db
-def test_user_get__anonymous(api_client: APIClient, user_factory):
+def test_user_get__anonymous(api_client: APIClient, pool_user):
     """Test user retrieve (anonymous request)."""
-    user = user_factory()
-    response = api_client.get(get_user_url(user.pk))
+    response = api_client.get(get_user_url(pool_user.pk))
     assert_response(response, 401, {
         'detail': "Authentication credentials were not provided."
     })
 
 @pytest.mark.django_db
-def test_user_get__wrong_token(api_client: APIClient, user_factory):
+def test_user_get__wrong_token(api_client: APIClient, pool_user):
     """Test user retrieve (incorrect access token)."""
-    user = user_factory()
-    api_client.credentials(HTTP_AUTHORIZATION='Bearer TralaleroTralala')
-    response = api_client.get(get_user_url(user.pk))
+    set_bearer(api_client, 'TralaleroTralala')
+    response = api_client.get(get_user_url(pool_user.pk))
     assert_response(response, 401, {
         'detail': "Given token not valid for any token type",
         'code': 'token_not_valid',
@@ -172,44 +136,42 @@ def test_user_get__wrong_token(api_client: APIClient, user_factory):
     })
 
 @pytest.mark.django_db
-def test_user_get__another_user(api_client_auth: APIClient, user_factory):
+def test_user_get__another_user(api_client_auth: APIClient, pool_user):
     """Test user retrieve (as another user)."""
-    user = user_factory()
-    response = api_client_auth.get(get_user_url(user.pk))
+    response = api_client_auth.get(get_user_url(pool_user.pk))
     assert_response(response, 403, {
         'detail': "You do not have permission to perform this action."
     })
 
 @pytest.mark.django_db
-def test_user_get__success(api_client_auth: APIClient):
+def test_user_get__success(api_client_auth: APIClient, user_payload):
     """Test user retrieve."""
     # noinspection PyUnresolvedReferences
     user = api_client_auth._user
     response = api_client_auth.get(get_user_url(user.pk))
-    assert_response(response, 200, UserSerializer(instance=user).data)
+    assert_response(response, 200, user_payload(user))
 
 @pytest.mark.django_db
-def test_user_patch__anonymous(api_client: APIClient, user_factory):
+def test_user_patch__anonymous(api_client: APIClient, pool_user, user_payload):
     """Test user update (anonymous request)."""
-    user = user_factory()
-    data = UserSerializer(instance=user).data
-    response = api_client.patch(get_user_url(user.pk), data)
+    data = user_payload(pool_user)
+    response = api_client.patch(get_user_url(pool_user.pk), data)
     assert_response(response, 401, {
         'detail': "Authentication credentials were not provided."
     })
 
 @pytest.mark.django_db
-def test_user_patch__another_user(api_client_auth: APIClient, user_factory):
+def test_user_patch__another_user(api_client_auth: APIClient, pool_user,
+        user_payload):
     """Test user update (as another user)."""
-    user = user_factory()
-    data = UserSerializer(instance=user).data
-    response = api_client_auth.patch(get_user_url(user.pk), data)
+    data = user_payload(pool_user)
+    response = api_client_auth.patch(get_user_url(pool_user.pk), data)
     assert_response(response, 403, {
         'detail': "You do not have permission to perform this action."
     })
 
 @pytest.mark.django_db
-def test_user_patch__success(api_client_auth: APIClient):
+def test_user_patch__success(api_client_auth: APIClient, user_payload):
     """Test user update."""
     # noinspection PyUnresolvedReferences
     user = api_client_auth._user
@@ -218,7 +180,7 @@ def test_user_patch__success(api_client_auth: APIClient):
         'last_name': 'Tarantino',
     }
     response = api_client_auth.patch(get_user_url(user.pk), data)
-    assert_response(response, 200, UserSerializer(instance=user).data | data)
+    assert_response(response, 200, user_payload(user) | data)
 
 @pytest.mark.django_db
 def test_email_verify__wrong_user(api_client: APIClient, user_factory):
@@ -434,7 +396,7 @@ def test_password_restore__success(api_client: APIClient, user_factory):
 
     response = api_client.post(get_user_url(user.pk, 'restore'), {
         'token': token.value,
-        'password': generate_password(),
+        'password': VALID_PASSWORD,
     })
     assert_response(response, 200, {
         'detail': "Password reset."
@@ -474,7 +436,7 @@ def test_password_restore__send_email(api_client: APIClient, user_factory,
     # But the new one is valid.
     response = api_client.post(get_user_url(user.pk, 'restore'), {
         'token': token2.value,
-        'password': generate_password(),
+        'password': VALID_PASSWORD,
     })
     assert_response(response, 200, {
         'detail': "Password reset."
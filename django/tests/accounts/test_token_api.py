@@ -6,23 +6,22 @@ from tests.utils import assert_response, get_token_url, user_make_and_login
 
 
 @pytest.mark.django_db
-def test_tokens_get__wrong_email(api_client: APIClient, user_factory):
+def test_tokens_get__wrong_email(api_client: APIClient, registered_user):
     """Test user login (incorrect email)."""
-    user = user_factory()
+    # noinspection PyUnresolvedReferences
     response = api_client.post(get_token_url(), {
-        'email': user.email + 'y',
-        'password': user._password,
+        'email': registered_user.email + 'y',
+        'password': registered_user._password,
     })
     assert_response(response, 401, {
         'detail': "No active account found with the given credentials"
     })
 
 @pytest.mark.django_db
-def test_tokens_get__wrong_password(api_client: APIClient, user_factory):
+def test_tokens_get__wrong_password(api_client: APIClient, registered_user):
     """Test user login (incorrect password)."""
-    user = user_factory()
     response = api_client.post(get_token_url(), {
-        'email': user.email,
+        'email': registered_user.email,
         'password': 'OopsIdidItAgain',
     })
     assert_response(response, 401, {
@@ -51,41 +50,38 @@ def test_tokens_get(api_client: APIClient, user_factory):
     assert 'refresh' in json and 'access' in json
 
 @pytest.mark.django_db
-def test_token_verify__wrong_token(api_client: APIClient, user_factory):
+def test_token_verify__wrong_token(api_client: APIClient, logged_in_tokens):
     """Test token verify (wrong token)."""
-    login_response = user_make_and_login(api_client, user_factory)
     # Verify incorrect access token.
     response = api_client.post(get_token_url('verify'), {
-        'token': login_response.data['access'] + 'y',
+        'token': logged_in_tokens['access'] + 'y',
     })
     assert response.status_code == 401
     # Verify incorrect refresh token.
     response = api_client.post(get_token_url('verify'), {
-        'token': login_response.data['refresh'] + 'y',
+        'token': logged_in_tokens['refresh'] + 'y',
     })
     assert response.status_code == 401
 
 @pytest.mark.django_db
-def test_token_verify(api_client: APIClient, user_factory):
+def test_token_verify(api_client: APIClient, logged_in_tokens):
     """Test token verify."""
-    login_response = user_make_and_login(api_client, user_factory)
     # Verify access token.
     response = api_client.post(get_token_url('verify'), {
-        'token': login_response.data['access'],
+        'token': logged_in_tokens['access'],
     })
     assert response.status_code == 200
     # Verify refresh token.
     response = api_client.post(get_token_url('verify'), {
-        'token': login_response.data['refresh'],
+        'token': logged_in_tokens['refresh'],
     })
     assert response.status_code == 200
 
 @pytest.mark.django_db
-def test_token_refresh__wrong_token(api_client: APIClient, user_factory):
+def test_token_refresh__wrong_token(api_client: APIClient, logged_in_tokens):
     """Test token refresh (wrong refresh token)."""
-    login_response = user_make_and_login(api_client, user_factory)
     response = api_client.post(get_token_url('refresh'), {
-        'refresh': login_response.data['refresh'] + 'y',
+        'refresh': logged_in_tokens['refresh'] + 'y',
     })
     assert_response(response, 401, {
         'detail': "Token is invalid",
@@ -93,13 +89,11 @@ def test_token_refresh__wrong_token(api_client: APIClient, user_factory):
     })
 
 @pytest.mark.django_db
-def test_token_refresh(api_client: APIClient, user_factory):
+def test_token_refresh(api_client: APIClient, logged_in_tokens):
     """Test token refresh."""
-    login_response = user_make_and_login(api_client, user_factory)
     response = api_client.post(get_token_url('refresh'), {
-        'refresh': login_response.data['refresh'],
+        'refresh': logged_in_tokens['refresh'],
     })
     assert response.status_code == 200
-    json = response.json()
-    assert len(json) == 2
-    assert 'access' in json
+    assert len(response.data) == 2
+    assert 'access' in response.data
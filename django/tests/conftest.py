@@ -1,14 +1,19 @@
+import itertools
 import random
+from collections.abc import Iterator
 
 # noinspection PyPackageRequirements
 import pytest
 # noinspection PyPackageRequirements
 import rstr
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import models
 # noinspection PyPackageRequirements
 from model_bakery import baker
 from rest_framework.test import APIClient
 
+from apps.accounts.serializers import UserSerializer
 from apps.base.models import PhoneField
 from apps.shop.models import (
     Category,
@@ -20,7 +25,7 @@ from apps.shop.models import (
     OrderLineItem
 )
 
-from .utils import generate_password, user_make_and_login
+from .utils import generate_password, mint_tokens, set_bearer
 
 
 def generate_phone_number() -> str:
@@ -38,35 +43,133 @@ def api_client() -> APIClient:
 
 @pytest.fixture(scope='session')
 def user_factory():
-    """Returns a factory for users with passwords."""
-    def factory(*args, _save=True, **kwargs):
-        user_factory = model_factory(get_user_model())
-        users = user_factory(*args, _save=False, **kwargs)
-        if _save:
-            def set_password_and_save(user):
-                password = generate_password()
-                user.set_password(password)
-                user.save()
-                user._password = password
-            if type(users) is list:
-                for u in users:
-                    set_password_and_save(u)
-            else:
-                set_password_and_save(users)
-        return users
+    """Returns a factory for users with passwords.
+
+    Users are built directly rather than with model_bakery: all they
+    need is a unique email and a couple of names, so there is no point
+    in introspecting the model and generating random values for every
+    field. The generated password is stored in the `_password`
+    attribute of saved users. Pass `_baker=True` to have model_bakery
+    fill the users' fields randomly instead.
+    """
+    user_model = get_user_model()
+    baker_factory = model_factory(user_model)
+    counter = itertools.count(1)
+
+    def prepare_user(**kwargs):
+        n = next(counter)
+        return user_model(**{
+            'email': f'user{n}@example.com',
+            'first_name': f'First{n}',
+            'last_name': f'Last{n}',
+        } | kwargs)
+
+    def set_password(user):
+        # `set_password()` keeps the raw password in `_password`, and
+        # only `save()` clears it (which `bulk_create()` never calls).
+        user.set_password(generate_password())
+        return user
+
+    def prepare_users(_quantity, _baker, **kwargs):
+        if _baker:
+            return baker_factory(_save=False, _quantity=_quantity, **kwargs)
+        if _quantity:
+            return [prepare_user(**kwargs) for _ in range(_quantity)]
+        return prepare_user(**kwargs)
+
+    def factory(_save=True, _quantity=None, _baker=False, **kwargs):
+        users = prepare_users(_quantity, _baker, **kwargs)
+        if not _save:
+            return users
+        if _quantity:
+            # Insert all the users with a single query.
+            return user_model.objects.bulk_create([
+                set_password(user) for user in users
+            ])
+        user = set_password(users)
+        password = user._password
+        user.save()
+        user._password = password
+        return user
     return factory
 
+@pytest.fixture(scope='session')
+def user_pool(django_db_setup, django_db_blocker) -> Iterator:
+    """Returns an endless iterator over a pool of users.
+
+    The pool is bulk-created once per test session, so it's meant for
+    tests that only need some user to exist and never modify it. Pool
+    users have no usable password.
+    """
+    user_model = get_user_model()
+    with django_db_blocker.unblock():
+        users = user_model.objects.bulk_create([
+            user_model(
+                email=f'pool{i}@example.com',
+                password=make_password(None),
+            )
+            for i in range(16)
+        ])
+    return itertools.cycle(users)
+
 @pytest.fixture
-def api_client_auth(api_client, user_factory) -> APIClient:
-    """Returns API client with access credentials."""
-    response = user_make_and_login(api_client, user_factory)
-    api_client.credentials(
-        HTTP_AUTHORIZATION='Bearer ' + response.data['access']
-    )
+def pool_user(user_pool):
+    """Returns a read-only user from the session user pool."""
+    return next(user_pool)
+
+@pytest.fixture(scope='session')
+def user_payload():
+    """Returns a function to get serialized user data.
+
+    Data is cached by user ID, so it's only meant for users living for
+    the whole session (pool users and the authenticated client's user).
+    """
+    cache = {}
+    def f(user) -> dict:
+        if user.pk not in cache:
+            cache[user.pk] = UserSerializer(instance=user).data
+        return cache[user.pk]
+    return f
+
+@pytest.fixture
+def registered_user(db, user_factory):
+    """Returns an active user with a verified email address."""
+    return user_factory(is_active=True, is_verified=True)
+
+@pytest.fixture
+def logged_in_tokens(registered_user) -> dict:
+    """Returns access and refresh tokens of a logged-in user."""
+    return mint_tokens(registered_user)
+
+@pytest.fixture(scope='session')
+def _api_client_auth(django_db_setup, django_db_blocker,
+        user_factory) -> APIClient:
+    """Returns API client with access credentials shared by all tests.
+
+    The user is created and issued tokens only once per test session,
+    so tests don't pay for a registration and a login each.
+    """
+    with django_db_blocker.unblock():
+        user = user_factory(is_active=True, is_verified=True)
+        tokens = mint_tokens(user)
+    api_client = APIClient()
+    set_bearer(api_client, tokens['access'])
     # noinspection PyUnresolvedReferences,PyProtectedMember
-    api_client._user = response._user
+    api_client._user = user
     return api_client
 
+@pytest.fixture
+def api_client_auth(db, _api_client_auth) -> APIClient:
+    """Returns API client with access credentials.
+
+    The client is shared by all tests, so its user is reloaded to drop
+    any in-memory changes made by previous tests. Database changes are
+    rolled back after every test as usual.
+    """
+    # noinspection PyUnresolvedReferences,PyProtectedMember
+    _api_client_auth._user.refresh_from_db()
+    return _api_client_auth
+
 @pytest.fixture(scope='session')
 def category_factory():
     """Returns a factory to make category instances."""
@@ -76,14 +179,18 @@ def category_factory():
 def product_factory(seller_factory):
     """Returns a factory to make product instances."""
     f = model_factory(Product)
-    def factory(*args, **kwargs):
+    def factory(*args, _fill_optional=False, **kwargs):
         # Default product quantity is zero, so ensure we have something
         # in the stock.
         if 'quantity' not in kwargs:
             kwargs['quantity'] = random.randint(100, 500)
         if 'seller' not in kwargs:
-            kwargs['seller'] = seller_factory(is_active=True)
-        return f(*args, **kwargs)
+            kwargs['seller'] = seller_factory(
+                is_active=True, _fill_optional=_fill_optional)
+        # Product model has a default, which model_bakery always uses.
+        if _fill_optional and 'model' not in kwargs:
+            kwargs['model'] = rstr.letters(5, 20)
+        return f(*args, _fill_optional=_fill_optional, **kwargs)
     return factory
 
 @pytest.fixture(scope='session')
@@ -92,31 +199,63 @@ def catalog_factory(user_factory, seller_factory, category_factory, product_fact
 
     The factory being returned creates 5-10 sellers, 5-10 catalog
     categories and 5-10 products in every category associated with
-    a random seller.
+    a random seller. It returns a dict with lists of created `sellers`,
+    `categories` and `products`. Pass `_fill_optional=True` to fill
+    optional fields of sellers and products.
     """
-    def factory(min_objects: int = 5, max_objects: int = 10):
+    def factory(min_objects: int = 5, max_objects: int = 10,
+            _fill_optional: bool = False) -> dict:
         def add_products(category: Category):
-            products = product_factory(
+            # Pass the category right away: otherwise model_bakery makes
+            # a throwaway category for every product.
+            products.extend(product_factory(
+                category=category,
                 seller=random.choice(sellers),
-                _quantity=random.randint(min_objects, max_objects)
-            )
-            category.products.add(*products)
+                _quantity=random.randint(min_objects, max_objects),
+                _fill_optional=_fill_optional
+            ))
         sellers = seller_factory(
             user=user_factory(),
             is_active=True,
-            _quantity=random.randint(min_objects, max_objects)
+            _quantity=random.randint(min_objects, max_objects),
+            _fill_optional=_fill_optional
         )
         categories = category_factory(
             _quantity=random.randint(min_objects, max_objects)
         )
-        if type(categories) is list:
-            for cat in categories:
-                add_products(cat)
-        else:
-            add_products(categories)
-        return categories
+        products = []
+        for cat in categories:
+            add_products(cat)
+        return {
+            'sellers': sellers,
+            'categories': categories,
+            'products': products,
+        }
     return factory
 
+@pytest.fixture(scope='module')
+def catalog(django_db_setup, django_db_blocker,
+        catalog_factory) -> Iterator[dict]:
+    """Returns a catalog shared by all tests of a module.
+
+    The catalog is built only once per module, so it's only meant for
+    tests that don't change it. Its own rows are removed when the module
+    is done, so tests of other modules never see them.
+    """
+    with django_db_blocker.unblock():
+        # Tests compare full product payloads, optional fields included.
+        catalog = catalog_factory(_fill_optional=True)
+    yield catalog
+    with django_db_blocker.unblock():
+        # Deleting the owner of the catalog sellers also deletes the
+        # sellers and their products.
+        get_user_model().objects.filter(
+            sellers__in=catalog['sellers']
+        ).delete()
+        Category.objects.filter(
+            pk__in=[c.pk for c in catalog['categories']]
+        ).delete()
+
 @pytest.fixture(scope='session')
 def shipping_address_factory():
     """Returns a factory to make shipping address instances."""
@@ -130,18 +269,58 @@ def shipping_address_factory():
         _kwargs = {**kwargs}
         if 'phone_number' not in _kwargs:
             _kwargs['phone_number'] = generate_phone_number()
+        # Same for the administrative area, when optional fields are
+        # to be filled.
+        if (_kwargs.get('_fill_optional')
+                and 'administrative_area' not in _kwargs):
+            _kwargs['administrative_area'] = rstr.letters(5, 20)
         return f(*args, **_kwargs)
     return factory
 
 @pytest.fixture(scope='session')
-def order_factory(cart_line_item_factory):
+def shipping_address_data(shipping_address_factory) -> dict:
+    """Returns valid data of a new shipping address.
+
+    The data is shared by all tests, so tests must not modify it.
+    """
+    sa = shipping_address_factory(_save=False)
+    return {
+        'full_name': sa.full_name,
+        'phone_number': str(sa.phone_number),
+        'street_address': sa.street_address,
+        'locality': sa.locality,
+        'administrative_area': sa.administrative_area,
+        'postal_code': sa.postal_code,
+        'country': sa.country,
+    }
+
+@pytest.fixture(scope='session')
+def order_factory(product_factory, seller_factory, shipping_address_factory):
     """Returns a factory to make order instances."""
     f = model_factory(Order)
-    line_item_factory = model_factory(OrderLineItem)
-    def factory(*args, _save=True, **kwargs):
-        if 'line_items' not in kwargs:
-            kwargs['line_items'] = line_item_factory(_quantity=3)
-        return f(*args, _save=True, **kwargs)
+    def factory(*args, _save=True, _fill_optional=False, **kwargs):
+        if _fill_optional:
+            # model_bakery doesn't fill optional fields of the related
+            # objects it makes, so make them here.
+            if 'seller' not in kwargs:
+                kwargs['seller'] = seller_factory(_fill_optional=True)
+            if 'shipping_address' not in kwargs:
+                kwargs['shipping_address'] = shipping_address_factory(
+                    _fill_optional=True)
+        if 'line_items' in kwargs:
+            return f(*args, _save=True, _fill_optional=_fill_optional,
+                     **kwargs)
+        # Save the order first, so its line items can be inserted with
+        # a single query, and take their products from the order's
+        # seller rather than making a new seller for every product.
+        order = f(*args, _save=True, _fill_optional=_fill_optional,
+                  **kwargs)
+        OrderLineItem.objects.bulk_create([
+            OrderLineItem(order=order, product=product)
+            for product in product_factory(seller=order.seller, _quantity=3,
+                                           _fill_optional=_fill_optional)
+        ])
+        return order
     return factory
 
 @pytest.fixture(scope='session')
@@ -160,12 +339,21 @@ def seller_factory():
     return model_factory(Seller)
 
 def model_factory(model):
-    """Returns a factory to make or prepare model instances."""
-    def factory(*args, _save=True, **kwargs):
-        if '_fill_optional' not in kwargs:
-            kwargs['_fill_optional'] = True
+    """Returns a factory to make or prepare model instances.
+
+    Several instances of a model are inserted with a single query, unless
+    the model overrides `save()`, which `bulk_create()` bypasses.
+    Optional fields are left empty, unless `_fill_optional=True` is
+    passed by tests that check how those fields are serialized.
+    """
+    bulk_create = model.save is models.Model.save
+    def factory(*args, _save=True, _fill_optional=False, **kwargs):
+        if bulk_create and kwargs.get('_quantity'):
+            kwargs.setdefault('_bulk_create', True)
         if _save:
-            return baker.make(model, *args, **kwargs)
+            return baker.make(model, *args, _fill_optional=_fill_optional,
+                              **kwargs)
         else:
-            return baker.prepare(model, *args, **kwargs)
+            return baker.prepare(model, *args, _fill_optional=_fill_optional,
+                                 **kwargs)
     return factory
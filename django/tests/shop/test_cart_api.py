@@ -19,28 +19,24 @@ def assert_cart(response: Response, status: int, expected: list[tuple[Product, i
             and their quantities.
     """
     # Cart content received from the API.
-    content_received = []
-    for item in response.data:
-        content_received.append((
-            item['product']['id'],
-            item['product']['title'],
-            item['product']['slug'],
-            item['quantity']
-        ))
-    content_received.sort()
+    content_received = {(
+        item['product']['id'],
+        item['product']['title'],
+        item['product']['slug'],
+        item['quantity']
+    ) for item in response.data}
 
     # Expected cart content.
-    content_expected = []
-    for product, quantity in expected:
-        content_expected.append((
-            product.pk,
-            product.title,
-            product.slug,
-            quantity
-        ))
-    content_expected.sort()
+    content_expected = {(
+        product.pk,
+        product.title,
+        product.slug,
+        quantity
+    ) for product, quantity in expected}
 
     assert response.status_code == status
+    # Sets drop duplicates, so compare sizes as well.
+    assert len(response.data) == len(expected)
     assert content_received == content_expected
 
 @pytest.mark.django_db
@@ -52,11 +48,13 @@ def test_cart_list__anonymous(api_client: APIClient):
     })
 
 @pytest.mark.django_db
-def test_cart_list__empty(api_client_auth: APIClient, catalog_factory):
+def test_cart_list__empty(api_client_auth: APIClient, catalog_factory,
+        django_assert_max_num_queries):
     """Test empty cart."""
     catalog_factory(1, 1)
 
-    response = api_client_auth.get(get_cart_url())
+    with django_assert_max_num_queries(2):
+        response = api_client_auth.get(get_cart_url())
     assert_response(response, 200, [])
 
 @pytest.mark.django_db
@@ -70,9 +68,7 @@ def test_cart_add__no_product(api_client_auth: APIClient):
 @pytest.mark.django_db
 def test_cart_add__no_quantity(api_client_auth: APIClient, catalog_factory):
     """Test adding products to the cart (no quantity)."""
-    catalog_factory(2, 2)
-
-    p = Product.objects.first()
+    p = catalog_factory(2, 2)['products'][0]
 
     response = api_client_auth.post(get_cart_url(), {
         'product_id': p.pk
@@ -123,31 +119,30 @@ def test_cart_add__seller_inactive(api_client_auth: APIClient, seller_factory,
     })
 
 @pytest.mark.django_db
-def test_cart_add__multiple(api_client_auth: APIClient, catalog_factory):
+def test_cart_add__multiple(api_client_auth: APIClient, catalog_factory,
+        django_assert_max_num_queries):
     """Test adding products to the cart (multiple products)."""
-    catalog_factory(2, 2)
+    products = catalog_factory(2, 2)['products']
     url = get_cart_url()
 
-    p1 = Product.objects.first()
-    p2 = Product.objects.last()
+    p1, p2 = products[0], products[-1]
 
     api_client_auth.post(url, {
         'product_id': p1.pk
     })
-    response = api_client_auth.post(url, {
-        'product_id': p2.pk,
-        'quantity': 6
-    })
+    with django_assert_max_num_queries(7):
+        response = api_client_auth.post(url, {
+            'product_id': p2.pk,
+            'quantity': 6
+        })
     assert_cart(response, 201, [(p1, 1), (p2, 6)])
 
 @pytest.mark.django_db
 def test_cart_add__repeat(api_client_auth: APIClient, catalog_factory):
     """Test adding products to the cart (the same product twice)."""
-    catalog_factory(1, 1)
+    p = catalog_factory(1, 1)['products'][0]
     url = get_cart_url()
 
-    p = Product.objects.first()
-
     api_client_auth.post(url, {
         'product_id': p.pk
     })
@@ -161,16 +156,18 @@ def test_cart_add__repeat(api_client_auth: APIClient, catalog_factory):
 
 @pytest.mark.django_db
 def test_cart_add__several_users(api_client_auth: APIClient, catalog_factory,
-        user_factory):
+        user_factory, django_assert_max_num_queries):
     """Test adding products to the cart (several users)."""
-    catalog_factory(2, 4)
+    products = catalog_factory(2, 4)['products']
     url = get_cart_url()
 
-    users = [user_factory(), user_factory()]
+    users = user_factory(_quantity=2)
     cart1 = []
 
+    cart_line_items = []
+
     # Add all products to 3 carts (via API to the first one).
-    for i, p in enumerate(Product.objects.all()):
+    for i, p in enumerate(products):
         q = random.randint(1, 10)
         if i % 3 == 2:
             api_client_auth.post(url, {
@@ -179,21 +176,27 @@ def test_cart_add__several_users(api_client_auth: APIClient, catalog_factory,
             })
             cart1.append((p, q))
         else:
-            CartLineItem(user=users[i % 3], product=p, quantity=q).save()
-
-    response = api_client_auth.get(url)
+            cart_line_items.append(
+                CartLineItem(user=users[i % 3], product=p, quantity=q)
+            )
+    CartLineItem.objects.bulk_create(cart_line_items)
+
+    # Line items come with their products in a single query.
+    with django_assert_max_num_queries(2):
+        response = api_client_auth.get(url)
     assert_cart(response, 200, cart1)
 
 def _prepare_cart_for_edit(api_client_auth: APIClient, catalog_factory):
     """Adds all products to the current user's cart."""
-    catalog_factory(2, 2)
+    products = catalog_factory(2, 2)['products']
     create_url = get_cart_url()
 
     cart = {}
 
     # Add all products to the cart one by one.
-    for p in Product.objects.all():
-        q = random.randint(1, p.quantity)
+    for p in products:
+        # Leave room in the stock for test_cart_update to add one more.
+        q = random.randint(1, p.quantity - 1)
         response = api_client_auth.post(create_url, {
             'product_id': p.pk,
             'quantity': q
@@ -234,15 +237,17 @@ def test_cart_update__seller_inactive(api_client_auth: APIClient,
     })
 
 @pytest.mark.django_db
-def test_cart_update(api_client_auth: APIClient, catalog_factory):
+def test_cart_update(api_client_auth: APIClient, catalog_factory,
+        django_assert_max_num_queries):
     """Test updating products to the cart."""
     cart = _prepare_cart_for_edit(api_client_auth, catalog_factory)
 
     # Increase quantities of products in the cart one by one.
     for pk, (p, q) in cart.items():
-        response = api_client_auth.patch(get_cart_url(pk), {
-            'quantity': q + 1
-        })
+        with django_assert_max_num_queries(5):
+            response = api_client_auth.patch(get_cart_url(pk), {
+                'quantity': q + 1
+            })
         cart[pk] = (p, q + 1)
         assert_cart(response, 200, list(cart.values()))
 
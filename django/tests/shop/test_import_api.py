@@ -1,72 +1,103 @@
 import json
 from contextlib import contextmanager
-from typing import Literal
+from functools import cache
 
 # noinspection PyPackageRequirements
 import pytest
 import requests
-import yaml
 from django.conf import settings
-from django.contrib.auth.models import Permission
 from django.core.files.uploadedfile import SimpleUploadedFile
 from rest_framework.test import APIClient
 
-from apps.accounts.models import User
-from apps.base.utils import slugify
+from apps.base.utils import slugify, load_yaml
 from apps.shop.models import Product, Category
 from tests.utils import get_import_url, assert_response
 
-
 PRODUCTS_FILENAME = 'products'
-
-
-def grant_permission(user: User, permission: Literal['add', 'change', 'delete']):
-    """Grants given seller permission to the user."""
-    p = Permission.objects.get(codename=f'{permission}_seller')
-    user.user_permissions.add(p)
-
+# Parsers of test data by file extension.
+PARSERS = {
+    'json': json.loads,
+    'yaml': load_yaml,
+}
+# Test data files share category titles, so slugify each only once.
+cached_slugify = cache(slugify)
+# Templates of "No categories" errors by category field, in the order of
+# precedence of the fields. Category titles are looked up by slug.
+NO_CATEGORY_ERRORS = {
+    'category_id': 'Invalid pk "%s" - object does not exist.',
+    'category_slug': "Object with slug=%s does not exist.",
+    'category_title': "Object with slug=%s does not exist.",
+}
+# URL of the repository directory with test data files.
+FILES_URL = 'https://raw.githubusercontent.com/swba/netology.py.diploma/refs/heads/main/django/tests/shop/data/products/'
+
+
+@cache
 def get_file_path(filename: str) -> str:
     """Returns path to a file with test data."""
     return settings.BASE_DIR / 'tests' / 'shop' / 'data' / 'products' / filename
 
+def parse_content(filename: str, content: bytes) -> dict|None:
+    """Parses text data according to the file extension."""
+    parser = PARSERS.get(filename.rsplit('.', 1)[-1])
+    return parser(content) if parser else None
+
+@cache
+def read_file(filename: str) -> bytes:
+    """Reads file with test data."""
+    with open(get_file_path(filename), 'rb') as file:
+        return file.read()
+
+@cache
 def parse_file(filename: str) -> dict|None:
-    """Parses file with text data."""
-    with open(get_file_path(filename), encoding='utf-8') as file:
-        ext = filename.split('.')[-1]
-        if ext == 'json':
-            return json.load(file)
-        elif ext == 'yaml':
-            return yaml.full_load(file)
-        else:
-            return None
+    """Parses file with text data.
+
+    Parsed data is cached, so it must not be changed by callers.
+    """
+    return parse_content(filename, read_file(filename))
 
 def get_file_url(filename: str) -> str:
     """Returns URL of a file with test data."""
-    return f'https://raw.githubusercontent.com/swba/netology.py.diploma/refs/heads/main/django/tests/shop/data/products/{filename}'
+    return FILES_URL + filename
 
+@cache
 def parse_url(filename: str) -> dict|None:
-    """Parses remote file with text data."""
-    url = get_file_url(filename)
-    response = requests.get(url)
-    ext = filename.split('.')[-1]
-    if ext == 'json':
-        return response.json()
-    elif ext == 'yaml':
-        return yaml.full_load(response.content)
-    else:
-        return None
+    """Parses remote file with text data.
+
+    Parsed data is cached, so it must not be changed by callers.
+    """
+    response = requests.get(get_file_url(filename))
+    return parse_content(filename, response.content)
 
 @contextmanager
 def uploaded_file(filename: str):
     """Context manager that creates an uploaded file with test data."""
-    with open(get_file_path(filename), 'rb') as f:
-        yield SimpleUploadedFile(f.name, f.read(), content_type='text/plain')
+    yield SimpleUploadedFile(filename, read_file(filename),
+                             content_type='text/plain')
+
+@pytest.fixture(autouse=True)
+def local_file_urls(monkeypatch):
+    """Serves test data files from disk rather than from GitHub.
+
+    Both the tests and the import view fetch the files with
+    `requests.get()`, so patching it makes them skip the network.
+    """
+    get = requests.get
+    def fake_get(url, *args, **kwargs):
+        if not url.startswith(FILES_URL):
+            return get(url, *args, **kwargs)
+        response = requests.Response()
+        response.status_code = 200
+        response.url = url
+        response._content = read_file(url.removeprefix(FILES_URL))
+        return response
+    monkeypatch.setattr(requests, 'get', fake_get)
 
 
 @pytest.mark.django_db
 def test_import__anonymous(api_client: APIClient):
     """Test importing seller products (anonymous user)."""
-    response = api_client.post(get_import_url(), {})
+    response = api_client.post(get_import_url(), {}, format='json')
     assert_response(response, 401, {
         'detail': "Authentication credentials were not provided."
     })
@@ -80,7 +111,7 @@ def test_import__not_owner(api_client_auth: APIClient, seller_factory,
         'seller': seller.pk,
         'url': 'https://fake.site/data.json',
         'format': 'json',
-    })
+    }, format='json')
     assert_response(response, 400, {
         'seller': [f'Invalid pk "{seller.pk}" - object does not exist.']
     })
@@ -95,7 +126,7 @@ def test_import__no_url_no_file(api_client_auth: APIClient, seller_factory,
     response = api_client_auth.post(get_import_url(), {
         'seller': seller.pk,
         'format': 'json',
-    })
+    }, format='json')
     assert_response(response, 400, {
         'non_field_errors': ["URL or file is required."]
     })
@@ -110,7 +141,7 @@ def test_import__no_format(api_client_auth: APIClient, seller_factory,
     response = api_client_auth.post(get_import_url(), {
         'seller': seller.pk,
         'url': 'https://fake.site/data.json',
-    })
+    }, format='json')
     assert_response(response, 400, {
         'format': ["This field is required."]
     })
@@ -126,76 +157,63 @@ def test_import__wrong_format(api_client_auth: APIClient, seller_factory,
         'seller': seller.pk,
         'url': 'https://fake.site/data.json',
         'format': 'pdf',
-    })
+    }, format='json')
     assert_response(response, 400, {
         'format': ["Only `yaml` or `json` format is supported."]
     })
 
 def prepare_no_categories_expected_response(data):
     """Returns expected list of errors for "No categories" tests."""
-    expected = []
-    for row in data:
-        if 'category_id' in row:
-            category_id = row['category_id']
-            expected.append(
-                {
-                    'category_id': [f'Invalid pk "{category_id}" - object does not exist.']
-                }
-            )
-        elif 'category_slug' in row:
-            category_slug = row['category_slug']
-            expected.append(
-                {
-                    'category_slug': [f"Object with slug={category_slug} does not exist."]
-                }
-            )
-        else:
-            category_slug = slugify(row['category_title'])
-            expected.append(
-                {
-                    'category_title': [f"Object with slug={category_slug} does not exist."]
-                }
-            )
-    return expected
+    def get_error(row) -> dict:
+        # Category fields are checked in the order of precedence.
+        key = next(k for k in NO_CATEGORY_ERRORS if k in row)
+        value = row[key]
+        if key == 'category_title':
+            value = cached_slugify(value)
+        return {key: [NO_CATEGORY_ERRORS[key] % value]}
+    return [get_error(row) for row in data]
 
 @pytest.mark.django_db
-def test_import_file__no_categories(api_client_auth: APIClient, seller_factory):
+@pytest.mark.parametrize('ext', ['yaml', 'json'])
+def test_import_file__no_categories(api_client_auth: APIClient, seller_factory,
+        ext):
     """Test uploading seller products (no categories)."""
     # noinspection PyUnresolvedReferences
     seller = seller_factory(user=api_client_auth._user)
 
-    for ext in ('yaml', 'json'):
-        data = parse_file(f'{PRODUCTS_FILENAME}.{ext}')
-        expected = prepare_no_categories_expected_response(data)
+    data = parse_file(f'{PRODUCTS_FILENAME}.{ext}')
+    expected = prepare_no_categories_expected_response(data)
 
-        with uploaded_file(f'{PRODUCTS_FILENAME}.{ext}') as file:
-            response = api_client_auth.post(get_import_url(), {
-                'seller': seller.pk,
-                'format': ext,
-                'file': file,
-            })
-            assert_response(response, 400, expected)
+    with uploaded_file(f'{PRODUCTS_FILENAME}.{ext}') as file:
+        response = api_client_auth.post(get_import_url(), {
+            'seller': seller.pk,
+            'format': ext,
+            'file': file,
+        })
+        assert_response(response, 400, expected)
 
 @pytest.mark.django_db
-def test_import_url__no_categories(api_client_auth: APIClient, seller_factory):
+@pytest.mark.parametrize('ext', ['yaml', 'json'])
+def test_import_url__no_categories(api_client_auth: APIClient, seller_factory,
+        ext):
     """Test importing seller products from URL (no categories)."""
     # noinspection PyUnresolvedReferences
     seller = seller_factory(user=api_client_auth._user)
 
-    for ext in ('yaml', 'json'):
-        data = parse_url(f'{PRODUCTS_FILENAME}.{ext}')
-        expected = prepare_no_categories_expected_response(data)
+    data = parse_url(f'{PRODUCTS_FILENAME}.{ext}')
+    expected = prepare_no_categories_expected_response(data)
 
-        response = api_client_auth.post(get_import_url(), {
-            'seller': seller.pk,
-            'format': ext,
-            'url': get_file_url(f'{PRODUCTS_FILENAME}.{ext}'),
-        })
-        assert_response(response, 400, expected)
+    response = api_client_auth.post(get_import_url(), {
+        'seller': seller.pk,
+        'format': ext,
+        'url': get_file_url(f'{PRODUCTS_FILENAME}.{ext}'),
+    }, format='json')
+    assert_response(response, 400, expected)
 
 @pytest.mark.django_db
+@pytest.mark.parametrize('ext', ['yaml', 'json'])
 def test_import__invalid_data(api_client_auth: APIClient, category_factory,
-        seller_factory):
+        seller_factory, ext):
     """Test importing seller products (invalid data)."""
     category_factory(id=1),
     # noinspection PyUnresolvedReferences
@@ -211,35 +229,35 @@ def test_import__invalid_data(api_client_auth: APIClient, category_factory,
         ]}
     ]
 
-    for ext in ('yaml', 'json'):
-        # File upload.
-        with uploaded_file(f'{PRODUCTS_FILENAME}__invalid.{ext}') as file:
-            response = api_client_auth.post(get_import_url(), {
-                'seller': seller.pk,
-                'format': ext,
-                'file': file,
-            })
-            assert_response(response, 400, expected_response)
-
-        # Fetch from URL.
+    # File upload.
+    with uploaded_file(f'{PRODUCTS_FILENAME}__invalid.{ext}') as file:
         response = api_client_auth.post(get_import_url(), {
             'seller': seller.pk,
             'format': ext,
-            'url': get_file_url(f'{PRODUCTS_FILENAME}__invalid.{ext}'),
+            'file': file,
         })
         assert_response(response, 400, expected_response)
 
+    # Fetch from URL.
+    response = api_client_auth.post(get_import_url(), {
+        'seller': seller.pk,
+        'format': ext,
+        'url': get_file_url(f'{PRODUCTS_FILENAME}__invalid.{ext}'),
+    }, format='json')
+    assert_response(response, 400, expected_response)
+
 def prepare_successful_test(api_client_auth: APIClient, category_factory,
         seller_factory, product_factory):
     """Prepares data for successful import test."""
     # Create required categories.
     category_factory(id=1, title="Смартфоны"),
     category_factory(id=2, title="Телевизоры"),
-    category_factory(id=3, title="Flash-накопители")
+    category = category_factory(id=3, title="Flash-накопители")
 
-    # Create several products for another user and seller.
+    # Create several products for another user and seller. Put them in
+    # an existing category, or each of them gets a category of its own.
     seller = seller_factory()
-    product_factory(seller=seller, _quantity=5)
+    product_factory(seller=seller, category=category, _quantity=5)
 
     # Create a couple of sellers for the current user.
     # noinspection PyUnresolvedReferences,PyProtectedMember
@@ -247,72 +265,78 @@ def prepare_successful_test(api_client_auth: APIClient, category_factory,
     # noinspection PyUnresolvedReferences,PyProtectedMember
     return seller_factory(user=api_client_auth._user)
 
-def assert_successful_test(filename, seller, response):
+def assert_successful_test(data, seller, response):
     """Asserts successful import test."""
     assert_response(response, 200, {'detail': "Import completed."})
 
-    data = parse_url(filename)
-    products = Product.objects.filter(seller=seller)
+    # Load all the seller's products and categories at once, so that
+    # items are checked without querying the database for each of them.
+    products = list(
+        Product.objects.filter(seller=seller).prefetch_related('parameters')
+    )
+    products_by_external_id = {p.external_id: p for p in products}
+    categories = list(Category.objects.all())
+    categories_by = {
+        'category_id': {c.pk: c for c in categories},
+        'category_slug': {c.slug: c for c in categories},
+        'category_title': {c.title: c for c in categories},
+    }
 
     # Check that all products were added.
-    assert len(data) == products.count()
+    assert len(data) == len(products)
 
     # Check that all added products have required external IDs.
-    external_ids = [item['external_id'] for item in data]
-    assert len(data) == products.filter(external_id__in=external_ids).count()
+    external_ids = {item['external_id'] for item in data}
+    assert external_ids == products_by_external_id.keys()
 
     # Check that all added products have required titles.
-    titles = [item['title'] for item in data]
-    assert len(data) == products.filter(title__in=titles).count()
+    titles = {item['title'] for item in data}
+    assert all(p.title in titles for p in products)
 
-    # Check that all added products belong to proper categories.
-    for item in data:
-        if 'category_id' in item:
-            category = Category.objects.get_or_none(pk=item['category_id'])
-        elif 'category_slug' in item:
-            category = Category.objects.get_or_none(slug=item['category_slug'])
-        else:
-            category = Category.objects.get_or_none(title=item['category_title'])
-        kwargs = {'external_id': item['external_id'], 'category': category}
-        assert products.filter(**kwargs).count() == 1
-
-    # Check that all products have a proper set of parameters.
     for item in data:
-        product = products.get(external_id=item['external_id'])
+        product = products_by_external_id[item['external_id']]
+
+        # Check that the product belongs to a proper category.
+        for key in ('category_id', 'category_slug', 'category_title'):
+            if key in item:
+                assert product.category == categories_by[key].get(item[key])
+                break
+
+        # Check that the product has a proper set of parameters.
         parameters = {p.name: p.value for p in product.parameters.all()}
         # All parameters' values are string, so convert them.
         expected = {n: str(v) for n, v in item['parameters'].items()}
         assert expected == parameters
 
 @pytest.mark.django_db
+@pytest.mark.parametrize('ext', ['yaml', 'json'])
 def test_import_file__success(api_client_auth, category_factory, seller_factory,
-        product_factory):
+        product_factory, ext):
     """Test uploading seller products (success)."""
     seller = prepare_successful_test(api_client_auth, category_factory,
                                      seller_factory, product_factory)
 
-    for ext in ('yaml', 'json'):
-        filename = f'{PRODUCTS_FILENAME}.{ext}'
-        with uploaded_file(filename) as file:
-            response = api_client_auth.post(get_import_url(), {
-                'seller': seller.pk,
-                'format': ext,
-                'file': file,
-            })
-        assert_successful_test(filename, seller, response)
+    filename = f'{PRODUCTS_FILENAME}.{ext}'
+    with uploaded_file(filename) as file:
+        response = api_client_auth.post(get_import_url(), {
+            'seller': seller.pk,
+            'format': ext,
+            'file': file,
+        })
+    assert_successful_test(parse_file(filename), seller, response)
 
 @pytest.mark.django_db
+@pytest.mark.parametrize('ext', ['yaml', 'json'])
 def test_import_url__success(api_client_auth, category_factory, seller_factory,
-        product_factory):
+        product_factory, ext):
     """Test fetching seller products (success)."""
     seller = prepare_successful_test(api_client_auth, category_factory,
                                      seller_factory, product_factory)
 
-    for ext in ('yaml', 'json'):
-        filename = f'{PRODUCTS_FILENAME}.{ext}'
-        response = api_client_auth.post(get_import_url(), {
-            'seller': seller.pk,
-            'format': ext,
-            'url': get_file_url(filename),
-        })
-        assert_successful_test(filename, seller, response)
+    filename = f'{PRODUCTS_FILENAME}.{ext}'
+    response = api_client_auth.post(get_import_url(), {
+        'seller': seller.pk,
+        'format': ext,
+        'url': get_file_url(filename),
+    }, format='json')
+    assert_successful_test(parse_url(filename), seller, response)
@@ -1,10 +1,7 @@
-import random
-from collections import defaultdict
-
 # noinspection PyPackageRequirements
 import pytest
 
-from apps.shop.models import Product, Order, CartLineItem
+from apps.shop.models import Order, CartLineItem
 from apps.shop.serializers import (
     SellerSerializer,
     ShippingAddressSerializer,
@@ -13,10 +10,28 @@ from apps.shop.serializers import (
 )
 from tests.utils import get_order_url, assert_response
 
+
+def fetch_orders(orders: list[Order]):
+    """Fetches orders with everything the order serializer needs."""
+    return (Order.objects
+            .filter(pk__in=[order.pk for order in orders])
+            .select_related('seller', 'shipping_address')
+            .prefetch_related('line_items__product')
+            .order_by('pk'))
+
 @pytest.mark.django_db
-def test_order_create__anonymous(api_client):
-    """Test creating an order (anonymous user)."""
-    response = api_client.post(get_order_url(), {})
+@pytest.mark.parametrize('method, url, data', [
+    ('post', get_order_url(), {}),
+    ('get', get_order_url(), None),
+    ('get', get_order_url(1), None),
+    ('patch', get_order_url(1), {'status': Order.Status.CONFIRMED.value}),
+], ids=['create', 'list', 'get', 'edit'])
+def test_order__anonymous(api_client, method, url, data):
+    """Test accessing orders (anonymous user).
+
+    Order 1 needn't exist: authentication is checked before the lookup.
+    """
+    response = getattr(api_client, method)(url, data)
     assert_response(response, 401, {
         'detail': "Authentication credentials were not provided."
     })
@@ -123,24 +138,26 @@ def test_order_create__seller_inactive(api_client_auth, seller_factory,
 
 @pytest.mark.django_db
 def test_order_create(api_client_auth, user_factory, catalog_factory,
-        shipping_address_factory, cart_line_item_factory, mailoutbox):
+        shipping_address_factory, mailoutbox):
     """Test creating an order."""
 
-    catalog_factory()
-    products = Product.objects.all()[:8]
+    products = catalog_factory()['products'][:8]
 
     # Prepare several carts.
     # noinspection PyUnresolvedReferences
     cur_user = api_client_auth._user
     users = [cur_user, user_factory()]
-    carts = defaultdict(list)
+    # Fixed quantities keep failures reproducible.
+    quantities = [3, 7, 1, 9, 4, 2, 8, 5]
+    carts = [[] for _ in users]
     for i, user in enumerate(users):
         for k in range(4):
-            carts[i].append(cart_line_item_factory(
+            carts[i].append(CartLineItem(
                 user=user,
                 product=products[i * 2 + k],
-                quantity=random.randint(1, 10),
+                quantity=quantities[i * 4 + k],
             ))
+    CartLineItem.objects.bulk_create([item for cart in carts for item in cart])
 
     # Order cart items for the current user.
     sa = shipping_address_factory(user=users[0])
@@ -170,35 +187,27 @@ def test_order_create(api_client_auth, user_factory, catalog_factory,
     assert mailoutbox[0].subject == "The products have been ordered"
     for email in mailoutbox[1:]:
         assert email.subject == "New order created"
-    # for email in mailoutbox:
-    #     print(email.body)
 
     # Check that the cart is now empty.
     assert CartLineItem.objects.filter(user=cur_user).count() == 0
 
-@pytest.mark.django_db
-def test_order_list__anonymous(api_client):
-    """Test listing orders (anonymous user)."""
-    response = api_client.get(get_order_url())
-    assert_response(response, 401, {
-        'detail': "Authentication credentials were not provided."
-    })
-
 @pytest.mark.django_db
 def test_order_list__user(api_client_auth, user_factory, order_factory,
-        shipping_address_factory):
+        shipping_address_factory, django_assert_max_num_queries):
     """Test listing orders (as a regular user)."""
     orders = []
     # noinspection PyUnresolvedReferences
     for user in [api_client_auth._user, user_factory(), user_factory()]:
-        sa = shipping_address_factory(user=user)
+        sa = shipping_address_factory(user=user, _fill_optional=True)
         for i in range(3):
-            order = order_factory(shipping_address=sa)
+            order = order_factory(shipping_address=sa, _fill_optional=True)
             # noinspection PyUnresolvedReferences
             if user == api_client_auth._user:
                 orders.append(order)
-    expected = [OrderSerializer(instance=order).data for order in orders]
-    response = api_client_auth.get(get_order_url())
+    expected = list(OrderSerializer(fetch_orders(orders), many=True).data)
+    # User, orders, line items and products, however many orders there are.
+    with django_assert_max_num_queries(4):
+        response = api_client_auth.get(get_order_url())
     assert_response(response, 200, expected[::-1])
 
 @pytest.mark.django_db
@@ -208,25 +217,16 @@ def test_order_list__seller(api_client_auth, user_factory, order_factory,
     orders = []
     # noinspection PyUnresolvedReferences
     for user in [api_client_auth._user, user_factory(), user_factory()]:
-        seller = seller_factory(user=user)
+        seller = seller_factory(user=user, _fill_optional=True)
         for i in range(3):
-            order = order_factory(seller=seller)
+            order = order_factory(seller=seller, _fill_optional=True)
             # noinspection PyUnresolvedReferences
             if user == api_client_auth._user:
                 orders.append(order)
-    expected = [OrderSerializer(instance=order).data for order in orders]
+    expected = list(OrderSerializer(fetch_orders(orders), many=True).data)
     response = api_client_auth.get(get_order_url() + '?as_seller=true')
     assert_response(response, 200, expected[::-1])
 
-@pytest.mark.django_db
-def test_order_get__anonymous(api_client, order_factory):
-    """Test retrieving order (anonymous user)."""
-    order = order_factory()
-    response = api_client.get(get_order_url(order.pk))
-    assert_response(response, 401, {
-        'detail': "Authentication credentials were not provided."
-    })
-
 @pytest.mark.django_db
 def test_order_get__another_user(api_client_auth, order_factory,
         shipping_address_factory, user_factory):
@@ -240,34 +240,25 @@ def test_order_get__another_user(api_client_auth, order_factory,
 
 @pytest.mark.django_db
 def test_order_get__user(api_client_auth, order_factory,
-        shipping_address_factory):
+        shipping_address_factory, django_assert_max_num_queries):
     """Test retrieving order (as a regular user)."""
     # noinspection PyUnresolvedReferences
-    sa = shipping_address_factory(user=api_client_auth._user)
-    order = order_factory(shipping_address=sa)
-    response = api_client_auth.get(get_order_url(order.pk))
+    sa = shipping_address_factory(user=api_client_auth._user,
+                                  _fill_optional=True)
+    order = order_factory(shipping_address=sa, _fill_optional=True)
+    with django_assert_max_num_queries(4):
+        response = api_client_auth.get(get_order_url(order.pk))
     assert_response(response, 200, OrderSerializer(instance=order).data)
 
 @pytest.mark.django_db
 def test_order_get__seller(api_client_auth, order_factory, seller_factory):
     """Test retrieving order (as a seller)."""
     # noinspection PyUnresolvedReferences
-    seller = seller_factory(user=api_client_auth._user)
-    order = order_factory(seller=seller)
+    seller = seller_factory(user=api_client_auth._user, _fill_optional=True)
+    order = order_factory(seller=seller, _fill_optional=True)
     response = api_client_auth.get(get_order_url(order.pk))
     assert_response(response, 200, OrderSerializer(instance=order).data)
 
-@pytest.mark.django_db
-def test_order_edit__anonymous(api_client, order_factory):
-    """Test patching order (anonymous user)."""
-    order = order_factory()
-    response = api_client.patch(get_order_url(order.pk), {
-        'status': Order.Status.CONFIRMED.value
-    })
-    assert_response(response, 401, {
-        'detail': "Authentication credentials were not provided."
-    })
-
 @pytest.mark.django_db
 def test_order_edit__another_user(api_client_auth, order_factory,
         shipping_address_factory, user_factory):
@@ -311,8 +302,7 @@ def test_order_edit__wrong_status(api_client_auth, order_factory, seller_factory
     }
 
     for cur_status, new_status in statuses.items():
-        order.status = cur_status
-        order.save()
+        Order.objects.filter(pk=order.pk).update(status=cur_status)
 
         response = api_client_auth.patch(get_order_url(order.pk), {
             'status': new_status.value,
@@ -334,13 +324,13 @@ def test_order_edit(api_client_auth, order_factory, seller_factory):
         Order.Status.SHIPPING: Order.Status.COMPLETED,
     }
 
+    expected = OrderSerializer(instance=order).data
     for cur_status, new_status in statuses.items():
-        order.status = cur_status
-        order.save()
+        Order.objects.filter(pk=order.pk).update(status=cur_status)
 
         response = api_client_auth.patch(get_order_url(order.pk), {
             'status': new_status.value,
         })
-        assert_response(response, 200, OrderSerializer(instance=order).data | {
+        assert_response(response, 200, expected | {
             'status': new_status.value,
         })
@@ -1,8 +1,13 @@
+from collections import defaultdict
+from operator import attrgetter
+
 # noinspection PyPackageRequirements
 import pytest
+from django.db.models import Max
+from rest_framework.settings import api_settings
 from rest_framework.test import APIClient
 
-from apps.shop.models import Product, Category, Seller
+from apps.shop.models import Product
 from apps.shop.serializers import ProductSerializer
 from tests.utils import (
     get_product_url,
@@ -14,124 +19,144 @@ from tests.utils import (
 
 def serialize_product_list(products: list[Product]) -> list[dict]:
     """Serializes a list of products."""
-    data = [ProductSerializer(instance=product).data for product in products]
+    products = (Product.objects
+                .filter(pk__in=[product.pk for product in products])
+                .select_related('category', 'seller')
+                .prefetch_related('parameters'))
+    data = list(ProductSerializer(products, many=True).data)
     data.sort(key=lambda item: item['title'])
     return data
 
+def get_first_page(products: list[Product]) -> list[Product]:
+    """Returns products on the first page of product search results."""
+    return sorted(products, key=attrgetter('title'))[:api_settings.PAGE_SIZE]
+
 @pytest.mark.django_db
-def test_product_search__all(api_client: APIClient, catalog_factory):
+def test_product_search__all(api_client: APIClient, catalog,
+        django_assert_max_num_queries):
     """Test product search (all records)."""
-    catalog_factory()
     url = get_product_url()
 
-    response = api_client.get(url)
+    # Count, page and product parameters, however many products there are.
+    with django_assert_max_num_queries(3):
+        response = api_client.get(url)
     assert response.status_code == 200
     assert response.data['results'] == serialize_product_list(
-        Product.objects.all().paginate().get_page(1)
+        get_first_page(catalog['products'])
     )
 
 @pytest.mark.django_db
-def test_product_search__title(api_client: APIClient, catalog_factory):
+def test_product_search__title(api_client: APIClient, catalog):
     """Test product search (by product title)."""
-    catalog_factory()
     url = get_product_url()
+    products = catalog['products']
 
-    title = Product.objects.first().title
+    title = products[0].title
     for n in range(1, 6):
         query = get_random_substring(title, n)
         response = api_client.get(url, {'title': query})
         assert response.status_code == 200
         assert response.data['results'] == serialize_product_list(
-            Product.objects.filter(title__icontains=query).paginate().get_page(1)
+            get_first_page([
+                p for p in products if query.lower() in p.title.lower()
+            ])
         )
 
 @pytest.mark.django_db
-def test_product_search__category(api_client: APIClient, catalog_factory):
+def test_product_search__category(api_client: APIClient, catalog):
     """Test product search (by category)."""
-    catalog_factory()
     url = get_product_url()
+    products = catalog['products']
 
-    for category in Category.objects.all():
-        response = api_client.get(url, {'category': category.pk})
+    for category_id in (c.pk for c in catalog['categories']):
+        response = api_client.get(url, {'category': category_id})
         assert response.status_code == 200
         assert response.data['results'] == serialize_product_list(
-            Product.objects.filter(category=category.pk).paginate().get_page(1)
+            get_first_page([
+                p for p in products if p.category_id == category_id
+            ])
         )
 
 @pytest.mark.django_db
-def test_product_search__seller(api_client: APIClient, catalog_factory):
+def test_product_search__seller(api_client: APIClient, catalog):
     """Test product search (by seller)."""
-    catalog_factory()
     url = get_product_url()
+    products = catalog['products']
 
-    for seller in Seller.objects.all():
-        response = api_client.get(url, {'seller': seller.pk})
+    for seller_id in (s.pk for s in catalog['sellers']):
+        response = api_client.get(url, {'seller': seller_id})
         assert response.status_code == 200
         assert response.data['results'] == serialize_product_list(
-            Product.objects.filter(seller=seller.pk).paginate().get_page(1)
+            get_first_page([
+                p for p in products if p.seller_id == seller_id
+            ])
         )
 
 @pytest.mark.django_db
-def test_product_search__price(api_client: APIClient, catalog_factory):
+def test_product_search__price(api_client: APIClient, catalog):
     """Test product search (by price)."""
-    catalog_factory()
     url = get_product_url()
+    products = catalog['products']
 
-    p1, p2 = get_random_price_range()
+    p1, p2 = get_random_price_range(products)
 
     # Check minimum price.
     response = api_client.get(url, {'price_min': p1})
     assert response.status_code == 200
     assert response.data['results'] == serialize_product_list(
-        Product.objects.filter(list_price__gte=p1).paginate().get_page(1)
+        get_first_page([p for p in products if p.list_price >= p1])
     )
 
     # Check maximum price.
     response = api_client.get(url, {'price_max': p2})
     assert response.status_code == 200
     assert response.data['results'] == serialize_product_list(
-        Product.objects.filter(list_price__lte=p2).paginate().get_page(1)
+        get_first_page([p for p in products if p.list_price <= p2])
     )
 
     # Check price range.
     response = api_client.get(url, {'price_min': p1, 'price_max': p2})
     assert response.status_code == 200
     assert response.data['results'] == serialize_product_list(
-        Product.objects.filter(
-            list_price__gte=p1,
-            list_price__lte=p2
-        ).paginate().get_page(1)
+        get_first_page([
+            p for p in products if p1 <= p.list_price <= p2
+        ])
     )
 
 @pytest.mark.django_db
-def test_product_search__complex(api_client: APIClient, catalog_factory):
+def test_product_search__complex(api_client: APIClient, catalog):
     """Test product search (complex search)."""
-    catalog_factory()
     url = get_product_url()
 
-    for category in Category.objects.all():
-        for seller in Seller.objects.all():
-            p1, p2 = get_random_price_range()
+    # Group products by category and seller once, so that expected
+    # results are computed without querying the database.
+    groups = defaultdict(list)
+    for product in catalog['products']:
+        groups[product.category_id, product.seller_id].append(product)
+
+    for category_id in (c.pk for c in catalog['categories']):
+        for seller_id in (s.pk for s in catalog['sellers']):
+            p1, p2 = get_random_price_range(catalog['products'])
             response = api_client.get(url, {
-                'category': category.pk,
-                'seller': seller.pk,
+                'category': category_id,
+                'seller': seller_id,
                 'price_min': p1,
                 'price_max': p2
             })
             assert response.status_code == 200
             assert response.data['results'] == serialize_product_list(
-                Product.objects.filter(
-                    category=category.pk,
-                    seller=seller.pk,
-                    list_price__gte=p1,
-                    list_price__lte=p2
-                ).paginate().get_page(1)
+                get_first_page([
+                    p for p in groups[category_id, seller_id]
+                    if p1 <= p.list_price <= p2
+                ])
             )
 
 @pytest.mark.django_db
 def test_product_get__not_exists(api_client):
     """Test retrieving product (not existing)."""
-    url = get_product_url(1)
+    # Products of a shared catalog may exist, so take an ID past them.
+    pk = (Product.objects.aggregate(Max('pk'))['pk__max'] or 0) + 1
+    url = get_product_url(pk)
 
     response = api_client.get(url)
     assert_response(response, 404, {
@@ -141,7 +166,7 @@ def test_product_get__not_exists(api_client):
 @pytest.mark.django_db
 def test_product_get(api_client, product_factory):
     """Test retrieving product."""
-    product = product_factory()
+    product = product_factory(_fill_optional=True)
     url = get_product_url(product.pk)
 
     response = api_client.get(url)
@@ -1,19 +1,10 @@
-from typing import Literal
-
 # noinspection PyPackageRequirements
 import pytest
-from django.contrib.auth.models import Permission
 from rest_framework.test import APIClient
 
-from apps.accounts.models import User
 from apps.shop.models import Seller
-from tests.utils import get_seller_url, assert_response
-
+from tests.utils import get_seller_url, assert_response, grant_permission
 
-def grant_permission(user: User, permission: Literal['add', 'change', 'delete']):
-    """Grants given permission to the user."""
-    p = Permission.objects.get(codename=f'{permission}_seller')
-    user.user_permissions.add(p)
 
 def serialize(seller: Seller):
     """Serializes a seller instance.
@@ -31,9 +22,17 @@ def serialize(seller: Seller):
 
 
 @pytest.mark.django_db
-def test_seller_add__anonymous(api_client: APIClient):
-    """Test adding a seller (anonymous user)."""
-    response = api_client.post(get_seller_url(), {})
+@pytest.mark.parametrize('method, url, data', [
+    ('post', get_seller_url(), {}),
+    ('patch', get_seller_url(1), {'title': "New title"}),
+    ('delete', get_seller_url(1), None),
+], ids=['add', 'edit', 'delete'])
+def test_seller__anonymous(api_client: APIClient, method, url, data):
+    """Test changing sellers (anonymous user).
+
+    Seller 1 needn't exist: authentication is checked before the lookup.
+    """
+    response = getattr(api_client, method)(url, data)
     assert_response(response, 401, {
         'detail': "Authentication credentials were not provided."
     })
@@ -76,9 +75,12 @@ def test_seller_add(api_client_auth: APIClient):
     })
 
 @pytest.mark.django_db
-def test_seller_list(api_client_auth: APIClient, seller_factory):
+def test_seller_list(api_client_auth: APIClient, seller_factory,
+        user_factory):
     """Test retrieving a list of sellers."""
-    sellers = seller_factory(_quantity=10)
+    # Sellers are bulk-created; one owner spares a user insert per seller.
+    sellers = seller_factory(user=user_factory(), _quantity=10,
+                             _fill_optional=True)
     response = api_client_auth.get(get_seller_url())
     assert_response(response, 200, [
         serialize(seller) for seller in sellers[::-1]
@@ -95,21 +97,10 @@ def test_seller_get__missing(api_client_auth: APIClient):
 @pytest.mark.django_db
 def test_seller_get(api_client_auth: APIClient, seller_factory):
     """Test retrieving a single seller details."""
-    seller = seller_factory()
+    seller = seller_factory(_fill_optional=True)
     response = api_client_auth.get(get_seller_url(seller.pk))
     assert_response(response, 200, serialize(seller))
 
-@pytest.mark.django_db
-def test_seller_edit__anonymous(api_client: APIClient, seller_factory):
-    """Test updating a seller (anonymous user)."""
-    seller = seller_factory()
-    response = api_client.patch(get_seller_url(seller.pk), {
-        'title': "New title",
-    })
-    assert_response(response, 401, {
-        'detail': "Authentication credentials were not provided."
-    })
-
 @pytest.mark.django_db
 def test_seller_edit__no_permission(api_client_auth: APIClient, seller_factory):
     """Test updating a seller (no permission)."""
@@ -149,15 +140,6 @@ def test_seller_edit(api_client_auth: APIClient, seller_factory):
         'title': "New title"
     })
 
-@pytest.mark.django_db
-def test_seller_delete__anonymous(api_client: APIClient, seller_factory):
-    """Test deleting a seller (anonymous user)."""
-    seller = seller_factory()
-    response = api_client.delete(get_seller_url(seller.pk))
-    assert_response(response, 401, {
-        'detail': "Authentication credentials were not provided."
-    })
-
 @pytest.mark.django_db
 def test_seller_delete__no_permission(api_client_auth: APIClient,
         seller_factory):
@@ -188,8 +170,7 @@ def test_seller_delete(api_client_auth: APIClient, seller_factory):
     seller = seller_factory(user=user)
 
     # Ensure the seller is here.
-    response = api_client_auth.get(get_seller_url(seller.pk))
-    assert_response(response, 200, serialize(seller))
+    assert Seller.objects.filter(pk=seller.pk).exists()
 
     # Delete it.
     grant_permission(user, 'delete')
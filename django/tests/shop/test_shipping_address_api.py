@@ -1,21 +1,84 @@
 # noinspection PyPackageRequirements
 import pytest
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory, force_authenticate
 
+from apps.accounts.models import User
 from apps.shop.models import ShippingAddress
+from apps.shop.views_api import ShippingAddressViewSet
 from tests.utils import get_shipping_address_url, assert_response
 
+add_view = ShippingAddressViewSet.as_view({'post': 'create'})
+request_factory = APIRequestFactory()
+
+
+def add(user: User, data: dict) -> Response:
+    """Calls the add view directly (bypassing the middleware)."""
+    request = request_factory.post(get_shipping_address_url(), data)
+    force_authenticate(request, user=user)
+    return add_view(request)
+
+def serialize(sa: ShippingAddress) -> dict:
+    """Serializes a shipping address instance."""
+    return {
+        'id': sa.pk,
+        'full_name': sa.full_name,
+        'phone_number': sa.phone_number,
+        'street_address': sa.street_address,
+        'locality': sa.locality,
+        'administrative_area': sa.administrative_area,
+        'postal_code': sa.postal_code,
+        'country': sa.country,
+    }
+
 @pytest.mark.django_db
-def test_shipping_address_add__anonymous(api_client):
-    """Test adding a shipping address (anonymous user)."""
-    response = api_client.post(get_shipping_address_url(), {})
+@pytest.mark.parametrize('method, url', [
+    ('post', get_shipping_address_url()),
+    ('get', get_shipping_address_url(1)),
+    ('patch', get_shipping_address_url(1)),
+    ('delete', get_shipping_address_url(1)),
+], ids=['add', 'get', 'patch', 'delete'])
+def test_shipping_address__anonymous(api_client, method, url):
+    """Test accessing shipping addresses (anonymous user).
+
+    Address 1 needn't exist: authentication is checked before the lookup.
+    """
+    response = getattr(api_client, method)(url, {})
     assert_response(response, 401, {
         'detail': "Authentication credentials were not provided."
     })
 
+@pytest.mark.django_db
+@pytest.mark.parametrize('method', ['get', 'patch', 'delete'])
+def test_shipping_address__another_user(api_client_auth, method,
+        shipping_address_factory):
+    """Test accessing a shipping address (under another account)."""
+    sa = shipping_address_factory() # Created for a new random user.
+    url = get_shipping_address_url(sa.pk)
+    response = getattr(api_client_auth, method)(url, {})
+    assert_response(response, 404, {
+        'detail': "No ShippingAddress matches the given query."
+    })
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('method', ['patch', 'delete'])
+def test_shipping_address__order_exists(api_client_auth, method,
+        shipping_address_factory, order_factory):
+    """Test changing a shipping address (with existing order)."""
+    # noinspection PyUnresolvedReferences
+    sa = shipping_address_factory(user=api_client_auth._user)
+    order_factory(shipping_address=sa)
+    url = get_shipping_address_url(sa.pk)
+    response = getattr(api_client_auth, method)(url, {})
+    assert_response(response, 403, {
+        'detail': "You do not have permission to perform this action."
+    })
+
 @pytest.mark.django_db
 def test_shipping_address_add__no_data(api_client_auth):
     """Test adding a shipping address (no data)."""
-    response = api_client_auth.post(get_shipping_address_url(), {})
+    # noinspection PyUnresolvedReferences
+    response = add(api_client_auth._user, {})
     assert_response(response, 400, {
         'full_name': ["This field is required."],
         'street_address': ["This field is required."],
@@ -27,7 +90,8 @@ def test_shipping_address_add__no_data(api_client_auth):
 @pytest.mark.django_db
 def test_shipping_address_add__partial_data(api_client_auth):
     """Test adding a shipping address (some data is missing)."""
-    response = api_client_auth.post(get_shipping_address_url(), {
+    # noinspection PyUnresolvedReferences
+    response = add(api_client_auth._user, {
         'full_name': "Michael Jordan",
         'locality': "Chicago",
         'country': "United States",
@@ -38,104 +102,32 @@ def test_shipping_address_add__partial_data(api_client_auth):
     })
 
 @pytest.mark.django_db
-def test_shipping_address_add__wrong_phone(api_client_auth, shipping_address_factory):
+def test_shipping_address_add__wrong_phone(api_client_auth, shipping_address_data):
     """Test adding a shipping address (incorrect phone number format)."""
-    sa = shipping_address_factory(_save=False)
-    data = {
-        'full_name': sa.full_name,
-        'phone_number': '223322223322',
-        'street_address': sa.street_address,
-        'locality': sa.locality,
-        'administrative_area': sa.administrative_area,
-        'postal_code': sa.postal_code,
-        'country': sa.country,
-    }
-    response = api_client_auth.post(get_shipping_address_url(), data)
+    data = shipping_address_data | {'phone_number': '223322223322'}
+    # noinspection PyUnresolvedReferences
+    response = add(api_client_auth._user, data)
     assert_response(response, 400, {
         'phone_number': ["Enter a valid value."],
     })
 
 @pytest.mark.django_db
-def test_shipping_address_add(api_client_auth, shipping_address_factory):
+def test_shipping_address_add(api_client_auth, shipping_address_data):
     """Test adding a shipping address."""
-    sa = shipping_address_factory(_save=False)
-    data = {
-        'full_name': sa.full_name,
-        'phone_number': sa.phone_number,
-        'street_address': sa.street_address,
-        'locality': sa.locality,
-        'administrative_area': sa.administrative_area,
-        'postal_code': sa.postal_code,
-        'country': sa.country,
-    }
+    data = shipping_address_data
     response = api_client_auth.post(get_shipping_address_url(), data)
     assert_response(response, 201, data | {
         'id': ShippingAddress.objects.order_by('-created_at').last().id,
     })
 
-@pytest.mark.django_db
-def test_shipping_address_get__anonymous(api_client, shipping_address_factory):
-    """Test getting a shipping address (anonymous request)."""
-    sa = shipping_address_factory()
-    response = api_client.get(get_shipping_address_url(sa.pk))
-    assert_response(response, 401, {
-        'detail': "Authentication credentials were not provided."
-    })
-
-@pytest.mark.django_db
-def test_shipping_address_get__another_user(api_client_auth, shipping_address_factory):
-    """Test getting a shipping address (under another account)."""
-    sa = shipping_address_factory() # Created for a new random user.
-    response = api_client_auth.get(get_shipping_address_url(sa.pk))
-    assert_response(response, 404, {
-        'detail': "No ShippingAddress matches the given query."
-    })
-
 @pytest.mark.django_db
 def test_shipping_address_get(api_client_auth, shipping_address_factory):
     """Test getting a shipping address."""
     # noinspection PyUnresolvedReferences
-    sa = shipping_address_factory(user=api_client_auth._user)
+    sa = shipping_address_factory(user=api_client_auth._user,
+                                  _fill_optional=True)
     response = api_client_auth.get(get_shipping_address_url(sa.pk))
-    assert_response(response, 200, {
-        'id': sa.pk,
-        'full_name': sa.full_name,
-        'phone_number': sa.phone_number,
-        'street_address': sa.street_address,
-        'locality': sa.locality,
-        'administrative_area': sa.administrative_area,
-        'postal_code': sa.postal_code,
-        'country': sa.country,
-    })
-
-@pytest.mark.django_db
-def test_shipping_address_patch__anonymous(api_client, shipping_address_factory):
-    """Test patching a shipping address (anonymous request)."""
-    sa = shipping_address_factory()
-    response = api_client.patch(get_shipping_address_url(sa.pk), {})
-    assert_response(response, 401, {
-        'detail': "Authentication credentials were not provided."
-    })
-
-@pytest.mark.django_db
-def test_shipping_address_patch__another_user(api_client_auth, shipping_address_factory):
-    """Test patching a shipping address (under another account)."""
-    sa = shipping_address_factory() # Created for a new random user.
-    response = api_client_auth.patch(get_shipping_address_url(sa.pk), {})
-    assert_response(response, 404, {
-        'detail': "No ShippingAddress matches the given query."
-    })
-
-@pytest.mark.django_db
-def test_shipping_address_patch__order_exists(api_client_auth, shipping_address_factory, order_factory):
-    """Test patching a shipping address (with existing order)."""
-    # noinspection PyUnresolvedReferences
-    sa = shipping_address_factory(user=api_client_auth._user)
-    order_factory(shipping_address=sa)
-    response = api_client_auth.patch(get_shipping_address_url(sa.pk), {})
-    assert_response(response, 403, {
-        'detail': "You do not have permission to perform this action."
-    })
+    assert_response(response, 200, serialize(sa))
 
 @pytest.mark.django_db
 def test_shipping_address_patch(api_client_auth, shipping_address_factory):
@@ -146,54 +138,18 @@ def test_shipping_address_patch(api_client_auth, shipping_address_factory):
         'full_name': "Lemmy",
         'country': "Great Britain",
     })
-    assert_response(response, 200, {
-        'id': sa.pk,
+    assert_response(response, 200, serialize(sa) | {
         'full_name': "Lemmy",
-        'phone_number': sa.phone_number,
-        'street_address': sa.street_address,
-        'locality': sa.locality,
-        'administrative_area': sa.administrative_area,
-        'postal_code': sa.postal_code,
         'country': "Great Britain",
     })
 
-@pytest.mark.django_db
-def test_shipping_address_delete__anonymous(api_client, shipping_address_factory):
-    """Test deleting a shipping address (anonymous request)."""
-    sa = shipping_address_factory()
-    response = api_client.delete(get_shipping_address_url(sa.pk))
-    assert_response(response, 401, {
-        'detail': "Authentication credentials were not provided."
-    })
-
-@pytest.mark.django_db
-def test_shipping_address_delete__another_user(api_client_auth, shipping_address_factory):
-    """Test deleting a shipping address (under another account)."""
-    sa = shipping_address_factory() # Created for a new random user.
-    response = api_client_auth.delete(get_shipping_address_url(sa.pk))
-    assert_response(response, 404, {
-        'detail': "No ShippingAddress matches the given query."
-    })
-
-@pytest.mark.django_db
-def test_shipping_address_delete__order_exists(api_client_auth, shipping_address_factory, order_factory):
-    """Test deleting a shipping address (with existing order)."""
-    # noinspection PyUnresolvedReferences
-    sa = shipping_address_factory(user=api_client_auth._user)
-    order_factory(shipping_address=sa)
-    response = api_client_auth.delete(get_shipping_address_url(sa.pk))
-    assert_response(response, 403, {
-        'detail': "You do not have permission to perform this action."
-    })
-
 @pytest.mark.django_db
 def test_shipping_address_delete(api_client_auth, shipping_address_factory):
     """Test deleting a shipping address."""
     # noinspection PyUnresolvedReferences
     sa = shipping_address_factory(user=api_client_auth._user)
     # The shipping address is here.
-    response = api_client_auth.get(get_shipping_address_url(sa.pk))
-    assert response.status_code == 200
+    assert ShippingAddress.objects.filter(pk=sa.pk).exists()
     # Delete it.
     response = api_client_auth.delete(get_shipping_address_url(sa.pk))
     assert response.status_code == 204
@@ -211,19 +167,14 @@ def test_shipping_address_list(api_client_auth, user_factory, shipping_address_f
     # Create several shipping addresses for several users.
     # noinspection PyUnresolvedReferences
     users = [api_client_auth._user, user_factory(), user_factory()]
-    for i in range(9):
-        sa = shipping_address_factory(user=users[i % 3])
+    addresses = ShippingAddress.objects.bulk_create([
+        shipping_address_factory(user=users[i % 3], _save=False,
+                                 _fill_optional=True)
+        for i in range(9)
+    ])
+    for i, sa in enumerate(addresses):
         if i % 3 == 0:
-            expected.append({
-                'id': sa.pk,
-                'full_name': sa.full_name,
-                'phone_number': sa.phone_number,
-                'street_address': sa.street_address,
-                'locality': sa.locality,
-                'administrative_area': sa.administrative_area,
-                'postal_code': sa.postal_code,
-                'country': sa.country,
-            })
+            expected.append(serialize(sa))
 
     response = api_client_auth.get(get_shipping_address_url())
     assert_response(response, 200, expected[::-1])
@@ -1,18 +1,25 @@
 import random
-import secrets
 import string
 from functools import cache
 from typing import Literal
 
-from django.db.models import Min, Max
+from django.contrib.auth.models import Permission
 from django.urls import reverse
 from rest_framework.response import Response
 from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
 
+from apps.accounts.models import User
 from apps.accounts.views_api import ProtectedActions
 from apps.shop.models import Product
 
+# Authorization header prefix of JWT access tokens.
+BEARER = 'Bearer '
+# Characters of generated passwords.
+PASSWORD_ALPHABET = string.ascii_letters + string.digits
 
+
+@cache
 def get_user_url(pk: int = None, action: ProtectedActions = None) -> str:
     """Returns user endpoint URL.
 
@@ -28,6 +35,7 @@ def get_user_url(pk: int = None, action: ProtectedActions = None) -> str:
         return reverse(f'api.accounts:user-{action}', kwargs={'pk': pk})
     return reverse('api.accounts:user-list')
 
+@cache
 def get_token_url(action: Literal['refresh', 'verify'] | None = None) -> str:
     """Returns token endpoint URL.
 
@@ -42,6 +50,7 @@ def get_token_url(action: Literal['refresh', 'verify'] | None = None) -> str:
         action = 'obtain_pair'
     return reverse(f'api.accounts:token_{action}')
 
+@cache
 def get_seller_url(pk=None) -> str:
     """Returns seller endpoint URL.
 
@@ -55,6 +64,7 @@ def get_seller_url(pk=None) -> str:
         return reverse('api.shop:seller-detail', kwargs={'pk': pk})
     return reverse('api.shop:seller-list')
 
+@cache
 def get_category_url(pk=None) -> str:
     """Returns category endpoint URL.
 
@@ -68,6 +78,7 @@ def get_category_url(pk=None) -> str:
         return reverse('api.shop:category-detail', kwargs={'pk': pk})
     return reverse('api.shop:category-list')
 
+@cache
 def get_product_url(pk=None) -> str:
     """Returns product endpoint URL.
 
@@ -81,6 +92,7 @@ def get_product_url(pk=None) -> str:
         return reverse('api.shop:product-detail', kwargs={'pk': pk})
     return reverse('api.shop:product-list')
 
+@cache
 def get_cart_url(pk=None) -> str:
     """Returns cart endpoint URL.
 
@@ -97,6 +109,7 @@ def get_cart_url(pk=None) -> str:
     else:
         return reverse('api.shop:cartlineitem-detail', kwargs={'pk': pk})
 
+@cache
 def get_shipping_address_url(pk=None) -> str:
     """Returns shipping address endpoint URL.
 
@@ -110,6 +123,7 @@ def get_shipping_address_url(pk=None) -> str:
         return reverse('api.shop:shippingaddress-detail', kwargs={'pk': pk})
     return reverse('api.shop:shippingaddress-list')
 
+@cache
 def get_order_url(pk=None) -> str:
     """Returns order endpoint URL.
 
@@ -123,6 +137,7 @@ def get_order_url(pk=None) -> str:
         return reverse('api.shop:order-detail', kwargs={'pk': pk})
     return reverse('api.shop:order-list')
 
+@cache
 def get_import_url() -> str:
     """Returns catalog import endpoint URL."""
     return reverse('api.shop:import')
@@ -141,8 +156,9 @@ def assert_response(response: Response, status: int, json: dict|list):
 
 def generate_password() -> str:
     """Generates an eight-character alphanumeric password."""
-    alphabet = string.ascii_letters + string.digits
-    return ''.join(secrets.choice(alphabet) for _ in range(8))
+    # Test passwords protect nothing, so there is no need for the
+    # (slower) cryptographically secure `secrets` module.
+    return ''.join(random.choices(PASSWORD_ALPHABET, k=8))
 
 def user_make_and_login(api_client: APIClient, user_make_factory) -> Response:
     """Makes and logs in a user."""
@@ -155,20 +171,33 @@ def user_make_and_login(api_client: APIClient, user_make_factory) -> Response:
     response._user = user
     return response
 
+def set_bearer(api_client: APIClient, token: str):
+    """Makes API client send the access token with every request."""
+    api_client.credentials(HTTP_AUTHORIZATION=BEARER + token)
+
+def mint_tokens(user) -> dict:
+    """Issues access and refresh tokens for a user, skipping the login."""
+    refresh = RefreshToken.for_user(user)
+    return {
+        'refresh': str(refresh),
+        'access': str(refresh.access_token),
+    }
+
+def grant_permission(user: User, permission: Literal['add', 'change', 'delete']):
+    """Grants given seller permission to the user."""
+    p = Permission.objects.get(codename=f'{permission}_seller')
+    user.user_permissions.add(p)
+
 # noinspection PyShadowingNames
 def get_random_substring(string: str, count: int) -> str:
     """Returns a random substring of a string."""
     index = random.randint(0, len(string) - count)
     return string[index:index + count]
 
-def get_random_price_range() -> tuple[int, int]:
-    """Returns random product price range."""
-    min_price, max_price = get_product_price_range()
+def get_random_price_range(products: list[Product]) -> tuple[int, int]:
+    """Returns random price range within list prices of the products."""
+    prices = [product.list_price for product in products]
+    min_price, max_price = min(prices), max(prices)
     p1 = random.randint(min_price, max_price)
     p2 = random.randint(min_price, max_price)
     return min(p1, p2), max(p1, p2)
-
-@cache
-def get_product_price_range() -> tuple[int, int]:
-    """Returns product price range."""
-    return Product.objects.aggregate(Min('price'), Max('price')).values()